@@ -8,7 +8,7 @@ The application's core functionality is a Flask web server that handles:
 1.  **Image Serving and Display.**
     -   It reads images from a hierarchical directory structure starting at 'unlabeled'.
     -   It dynamically serves a full-size vehicle image and an on-the-fly cropped license plate image for each file.
-    -   The license plate crop is generated using an external utility function (`run_detection_on_image`) and is not stored on disk.
+    -   The license plate crop is generated using an external utility function (`run_detection_on_image`) and cached on disk under `_crops`.
 
 2.  **User Interaction and File Management.**
     -   The user interface is provided by `labeler.html`, which uses JavaScript to navigate through the image list and handle actions.
@@ -23,40 +23,75 @@ The application's core functionality is a Flask web server that handles:
         -   `valid/`: The destination for successfully labeled images.
         -   `invalid/`: The destination for invalid images.
         -   `skipped/`: The destination for images that are skipped.
+        -   `_thumbs/`: Generated display thumbnails, mirroring the paths of the images above.
+        -   `_crops/`: Generated plate crops, mirroring the paths of the images above with `.jpg` appended.
     -   The `move_image` function ensures that the subdirectory structure (e.g., `Goa/Ambre_Colony`) is preserved in the destination folders, avoiding improper nesting.
 
 **Flask Routes:**
 
 -   `GET /`: Serves the main `labeler.html` interface.
--   `GET /images/all`: Returns a JSON array of all image paths from all managed directories.
+-   `GET /images/all`: Returns a JSON array of all image paths from all managed directories (optionally one page, via `offset`/`limit`).
 -   `GET /images/counts`: Returns the counts of images in each directory.
--   `GET /preview_crop/<path:filename>`: Generates and serves a cropped license plate image on-the-fly.
+-   `GET /preview_crop/<path:filename>`: Serves a cropped license plate image, running detection only the first time.
+-   `GET /thumb/<path:filename>`: Serves a downscaled copy of an image (at most 600px), cached on disk under `_thumbs`.
 -   `POST /images/label`: Moves an image to the 'valid' directory and renames it with the provided label.
 -   `POST /images/valid`: Moves an image to the 'valid' directory without changing the label.
 -   `POST /images/invalid`: Moves an image to the 'invalid' directory.
 -   `POST /images/skip`: Moves an image to the 'skipped' directory.
--   `GET /unlabeled/<path:filename>`: Serves images from the 'unlabeled' directory.
+-   `POST /images/batch`: Applies a list of the above actions in one request and returns the counts once.
+-   `GET /static_imgs/<path:filepath>`: Serves images from any managed directory (handled by `SharedDataMiddleware`, not a Flask view).
 
 **Dependencies:**
 
 -   `Flask`: For the web application framework.
+-   `orjson`: For fast JSON serialization of API responses.
 -   `shutil`: For file operations (moving files).
 -   `os`: For path manipulation.
 -   `Pillow` (`PIL`): For image handling.
+-   `opencv-python` (`cv2`): For encoding the plate crop; installed with `ultralytics`.
 -   `YOLO` (`ultralytics`): Assumed to be available for the detection model in `utils.py`.
 """
 
 import sys
 import os
+import gzip
+import errno
+import atexit
+import pickle
+import mimetypes
 import re
 import shutil
-from flask import Flask, request, render_template, jsonify, send_from_directory, send_file
-from io import BytesIO
+import threading
+import orjson
+from concurrent.futures import ThreadPoolExecutor, wait as futures_wait
+from flask import Flask, Response, request, render_template, jsonify, send_file
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.middleware.shared_data import SharedDataMiddleware
+from werkzeug.security import safe_join
+import cv2
+from urllib.parse import quote
 
 # Import your local utility function for license plate detection
-from utils import run_detection_on_image, count_images_in_directory
+from utils import run_detection_on_image, iter_images, save_thumbnail, load_detection_model, IMG_EXTS
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that parses request bodies and serializes responses with orjson instead of the stdlib json."""
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default), mimetype=self.mimetype)
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 BASE_DIR = os.path.join(current_dir, 'datasets')
@@ -64,70 +99,547 @@ UNLABELED = os.path.join(BASE_DIR, 'unlabeled')
 VALID_VEHICLE = os.path.join(BASE_DIR, 'valid')
 SKIPPED_VEHICLE = os.path.join(BASE_DIR, 'skipped')
 INVALID_VEHICLE = os.path.join(BASE_DIR, 'invalid')
+THUMBNAILS = os.path.join(BASE_DIR, '_thumbs')
+CROPS = os.path.join(BASE_DIR, '_crops')
+INDEX_CACHE_PATH = os.path.join(BASE_DIR, '.index.pkl')
+_BASE_PREFIX_LEN = len(BASE_DIR) + 1
+
+# Managed folders, keyed by the name used as the first path component in the UI.
+FOLDERS = {
+    'unlabeled': UNLABELED,
+    'valid': VALID_VEHICLE,
+    'invalid': INVALID_VEHICLE,
+    'skipped': SKIPPED_VEHICLE,
+}
+FOLDER_NAMES = {folder_path: folder_name for folder_name, folder_path in FOLDERS.items()}
+
+# --- Image Serving ---
+# Images are served by Werkzeug's static file middleware instead of a Flask view, so the bytes
+# go out through wsgi.file_wrapper (sendfile(2) where the server supports it). Each managed
+# folder is mounted on its own so nothing else under BASE_DIR is exposed. Responses carry an
+# ETag and Last-Modified, so repeat views are answered with 304 Not Modified.
+STATIC_IMAGES_URL = '/static_imgs'
+STATIC_IMAGES_MAX_AGE = 86400
+app.wsgi_app = SharedDataMiddleware(app.wsgi_app, {
+    f'{STATIC_IMAGES_URL}/{folder_name}': folder_path for folder_name, folder_path in FOLDERS.items()
+}, cache_timeout=STATIC_IMAGES_MAX_AGE)
+
+# When running behind nginx, set this to an `internal;` location that maps to THUMBNAILS
+# (e.g. '/_internal_thumbs') so /thumb hands the file to nginx with X-Accel-Redirect.
+X_ACCEL_THUMBS_URL = os.environ.get('X_ACCEL_THUMBS_URL', '').rstrip('/')
+
+# Destination folder for each action accepted by /images/batch.
+BATCH_ACTIONS = {
+    'label': VALID_VEHICLE,
+    'valid': VALID_VEHICLE,
+    'invalid': INVALID_VEHICLE,
+    'skip': SKIPPED_VEHICLE,
+}
+
+# Characters allowed in a label; everything else is stripped after upper-casing.
+_LABEL_RE = re.compile(r'[^A-Z0-9_-]')
+
+# JSON responses smaller than this are not worth compressing.
+COMPRESS_MIN_SIZE = 1024
+
+# In-memory index of image paths (relative to BASE_DIR) per folder. It is walked once at
+# startup and then kept up to date by move_image, so listing and counting never hit the disk.
+_IMAGES = {folder_name: set() for folder_name in FOLDERS}
+# st_mtime_ns of every directory in each folder when it was last listed or changed by a move.
+# Saved with the index so a restart can tell which folders changed while the app was down.
+_DIR_MTIMES = {folder_name: {} for folder_name in FOLDERS}
+_IMAGES_LOCK = threading.Lock()
+# Folders whose index entries can no longer be trusted and must be rescanned before use.
+# Everything starts dirty, so the index is also built if setup_directories() was not called.
+_DIRTY_FOLDERS = set(FOLDERS)
+# Bumped on every index change; cached responses built from the index are keyed on it.
+_index_generation = 0
+# The sorted /images/all list for one index generation, and its encoded body (plain and gzipped)
+# once it has been requested in full.
+_image_list_cache = {'generation': -1, 'images': [], 'body': None, 'gzipped_body': None}
+# Every this many moves, all folders are rescanned to pick up changes made outside the app.
+INDEX_RESCAN_INTERVAL = 500
+_moves_since_rescan = 0
+# (source_path, new_path) of every move indexed while a rescan is running, so the rescan can
+# apply them to what it found instead of being redone.
+_MOVES_DURING_SCAN = []
+_active_scans = 0
+
+# File moves run here so label/valid/invalid/skip requests return without waiting on the disk.
+MOVE_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix='move')
+# Destination directories already created (or found to exist) by a move.
+_KNOWN_DIRS = set()
+# Queued moves that have not finished yet, keyed by their new path relative to BASE_DIR.
+_PENDING_MOVES = {}
+_PENDING_MOVES_LOCK = threading.Lock()
 
 # --- Directory Setup ---
 def setup_directories():
-    """Ensures that all necessary directories exist."""
+    """Ensures that all necessary directories exist and builds the image index."""
     os.makedirs(UNLABELED, exist_ok=True)
     os.makedirs(VALID_VEHICLE, exist_ok=True)
     os.makedirs(INVALID_VEHICLE, exist_ok=True)
     os.makedirs(SKIPPED_VEHICLE, exist_ok=True)
+    build_image_index()
+    atexit.register(save_image_index)
+
+
+def scan_folder(folder_path):
+    """Returns the set of image paths under a folder, relative to BASE_DIR, and the mtimes of its directories."""
+    dir_mtimes = {}
+    # Every entry path starts with BASE_DIR and a separator, so slicing is enough; scandir
+    # paths are already normalized.
+    image_paths = {entry.path[_BASE_PREFIX_LEN:] for entry in iter_images(folder_path, dir_mtimes)}
+    if os.sep != '/':
+        image_paths = {path.replace(os.sep, '/') for path in image_paths}  # Normalize slashes for URLs
+    return image_paths, dir_mtimes
+
+
+def mark_folders_dirty(*folder_names):
+    """Flags folders for a rescan on the next index read."""
+    with _IMAGES_LOCK:
+        _DIRTY_FOLDERS.update(folder_name for folder_name in folder_names if folder_name in FOLDERS)
+
+
+def refresh_image_index():
+    """
+    Rescans the folders flagged dirty and replaces their index entries.
+
+    The folders are independent trees, so they are scanned on separate threads; the GIL
+    is released during the scandir/stat syscalls that dominate the walk. Queued moves are
+    already in the index but not yet on disk, so the scan waits for them first. Moves made
+    while scanning may or may not have been seen by the walk, so they are applied again to
+    its result before it replaces the index.
+    """
+    global _index_generation, _active_scans
+    with _IMAGES_LOCK:
+        dirty_folders = list(_DIRTY_FOLDERS)
+        _DIRTY_FOLDERS.clear()
+    if not dirty_folders:
+        return
+    # move_image updates the index and queues the move under _PENDING_MOVES_LOCK, so every
+    # move is either in this snapshot or recorded in _MOVES_DURING_SCAN.
+    with _PENDING_MOVES_LOCK:
+        pending_moves = list(_PENDING_MOVES.values())
+        with _IMAGES_LOCK:
+            _active_scans += 1
+            first_move = len(_MOVES_DURING_SCAN)
+    try:
+        futures_wait(pending_moves)
+        if len(dirty_folders) == 1:
+            # The usual case after a single failed move; no point spinning up a pool for it.
+            scanned = {dirty_folders[0]: scan_folder(FOLDERS[dirty_folders[0]])}
+        else:
+            with ThreadPoolExecutor(max_workers=len(dirty_folders)) as executor:
+                scanned = executor.map(scan_folder, (FOLDERS[folder_name] for folder_name in dirty_folders))
+                scanned = dict(zip(dirty_folders, scanned))
+        with _IMAGES_LOCK:
+            for source_path, new_path in _MOVES_DURING_SCAN[first_move:]:
+                src_folder = source_path.split('/', 1)[0]
+                dst_folder = new_path.split('/', 1)[0]
+                if src_folder in scanned:
+                    scanned[src_folder][0].discard(source_path)
+                if dst_folder in scanned:
+                    scanned[dst_folder][0].add(new_path)
+            for folder_name, (image_paths, dir_mtimes) in scanned.items():
+                _IMAGES[folder_name] = image_paths
+                _DIR_MTIMES[folder_name] = dir_mtimes
+            _index_generation += 1
+    finally:
+        with _IMAGES_LOCK:
+            _active_scans -= 1
+            if not _active_scans:
+                _MOVES_DURING_SCAN.clear()
+
+
+def build_image_index():
+    """
+    Builds the index of every managed folder.
+
+    Folders saved by save_image_index whose directories are all unchanged on disk are
+    loaded from the cache file; only the others are walked.
+    """
+    mark_folders_dirty(*FOLDERS)
+    load_image_index()
+    refresh_image_index()
+
+
+def _dir_mtimes_unchanged(dir_mtimes):
+    """Checks that every recorded directory still exists with the same mtime."""
+    try:
+        return all(os.stat(dir_path).st_mtime_ns == mtime_ns for dir_path, mtime_ns in dir_mtimes.items())
+    except OSError:
+        return False
+
+
+def load_image_index():
+    """
+    Restores folders from the index cache file if none of their directories changed since it was saved.
+
+    Adding, removing or renaming a file updates the mtime of the directory that holds it,
+    and a new subdirectory updates its parent's, so one stat per directory is enough to
+    detect any change without listing the files again.
+    """
+    try:
+        with open(INDEX_CACHE_PATH, 'rb') as f:
+            cached = pickle.load(f)
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        print(f"Ignoring unreadable index cache {INDEX_CACHE_PATH}: {e}", file=sys.stderr)
+        return
+    global _index_generation
+    for folder_name, (image_paths, dir_mtimes) in cached.items():
+        if folder_name in FOLDERS and dir_mtimes and _dir_mtimes_unchanged(dir_mtimes):
+            with _IMAGES_LOCK:
+                _IMAGES[folder_name] = image_paths
+                _DIR_MTIMES[folder_name] = dir_mtimes
+                _DIRTY_FOLDERS.discard(folder_name)
+                _index_generation += 1
+
+
+def save_image_index():
+    """Writes the index of every folder that is not dirty to the cache file, for a fast restart."""
+    with _IMAGES_LOCK:
+        cached = {
+            folder_name: (set(_IMAGES[folder_name]), dict(_DIR_MTIMES[folder_name]))
+            for folder_name in FOLDERS if folder_name not in _DIRTY_FOLDERS
+        }
+    tmp_path = f"{INDEX_CACHE_PATH}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, INDEX_CACHE_PATH)
+    except Exception as e:
+        print(f"Error saving index cache: {e}", file=sys.stderr)
+
+
+def is_indexed(rel_path):
+    """Checks whether an image path is in the index."""
+    with _IMAGES_LOCK:
+        return rel_path in _IMAGES.get(rel_path.split('/', 1)[0], ())
+
+
+def update_image_index(source_path, new_path):
+    """
+    Replaces a moved image's old path with its new path in the index.
+
+    If the old path was not indexed, the index has drifted from the disk and the source
+    folder is flagged for a rescan instead of being trusted.
+    """
+    global _index_generation, _moves_since_rescan
+    src_folder = source_path.split('/', 1)[0]
+    dst_folder = new_path.split('/', 1)[0]
+    with _IMAGES_LOCK:
+        if src_folder in _IMAGES:
+            if source_path in _IMAGES[src_folder]:
+                _IMAGES[src_folder].remove(source_path)
+            else:
+                _DIRTY_FOLDERS.add(src_folder)
+        _IMAGES[dst_folder].add(new_path)
+        if _active_scans:
+            _MOVES_DURING_SCAN.append((source_path, new_path))
+        _index_generation += 1
+        _moves_since_rescan += 1
+        if _moves_since_rescan >= INDEX_RESCAN_INTERVAL:
+            _moves_since_rescan = 0
+            _DIRTY_FOLDERS.update(FOLDERS)
+
+
+def stat_move_dirs(source_path, new_path):
+    """Returns (folder name, directory, mtime or None) for the two directories a move touches."""
+    move_dirs = []
+    for rel_path in (source_path, new_path):
+        dir_path = os.path.normpath(os.path.join(BASE_DIR, os.path.dirname(rel_path)))
+        try:
+            mtime_ns = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        move_dirs.append((rel_path.split('/', 1)[0], dir_path, mtime_ns))
+    return move_dirs
+
+
+def record_dir_mtimes(source_path, new_path, dirs_before):
+    """
+    Records the new mtimes of the two directories a finished move changed.
+
+    Without this the saved index would look stale for those folders on the next start.
+    dirs_before is stat_move_dirs from just before the move. A directory that was already
+    newer than its recorded mtime then was also changed outside the app. Its new mtime would
+    hide that change, so the folder is flagged for a rescan instead.
+    """
+    dirs_after = stat_move_dirs(source_path, new_path)
+    with _IMAGES_LOCK:
+        for (folder_name, dir_path, mtime_before), (_, _, mtime_after) in zip(dirs_before, dirs_after):
+            if folder_name not in _DIR_MTIMES:
+                continue
+            # A concurrent move into the same directory may already have recorded mtime_after.
+            if mtime_after is not None and _DIR_MTIMES[folder_name].get(dir_path) in (mtime_before, mtime_after):
+                _DIR_MTIMES[folder_name][dir_path] = mtime_after
+            else:
+                _DIRTY_FOLDERS.add(folder_name)
+
+
+def relocate_cached_files(source_path, new_path):
+    """
+    Moves the thumbnail and plate crop generated for an image along with it, if they exist.
+
+    If the image has none, any at the new path belong to a file the move overwrote and are removed.
+    """
+    for cache_dir, suffix in ((THUMBNAILS, ''), (CROPS, '.jpg')):
+        cached_path = os.path.join(cache_dir, source_path) + suffix
+        new_cached_path = os.path.join(cache_dir, new_path) + suffix
+        try:
+            os.makedirs(os.path.dirname(new_cached_path), exist_ok=True)
+            os.replace(cached_path, new_cached_path)
+        except FileNotFoundError:
+            try:
+                os.remove(new_cached_path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Could not remove stale cached file {new_cached_path}: {e}")
+        except OSError as e:
+            # Only a cache entry; it is generated again on the next request.
+            print(f"Could not move cached file {cached_path}: {e}")
+
+
+def _move_file(src_full_path, dest_subdir, dst_full_path):
+    """Moves one file into dest_subdir; returns False if the source does not exist."""
+    # Ensure the destination subdirectory exists, skipping the mkdir syscalls for known ones.
+    if dest_subdir not in _KNOWN_DIRS:
+        os.makedirs(dest_subdir, exist_ok=True)
+        _KNOWN_DIRS.add(dest_subdir)
+    # Move the file with a single rename; a missing source surfaces here instead of
+    # through a separate exists() check. os.replace overwrites an existing destination.
+    try:
+        os.replace(src_full_path, dst_full_path)
+    except FileNotFoundError:
+        if not os.path.isdir(dest_subdir):
+            # A known directory was removed from outside the app; create it again and retry.
+            _KNOWN_DIRS.discard(dest_subdir)
+            return _move_file(src_full_path, dest_subdir, dst_full_path)
+        print(f"Source file not found: {src_full_path}")
+        return False
+    except OSError as e:
+        # Only a cross-filesystem rename needs the copy-and-delete fallback; anything else is a real error.
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(src_full_path, dst_full_path)
+    print(f"Moved {src_full_path} to {dst_full_path}")
+    return True
+
+
+def _finish_move(source_path, new_path, src_full_path, dest_subdir, dst_full_path, previous_moves):
+    """Runs a queued move on MOVE_EXECUTOR and flags both folders for a rescan if it fails."""
+    # Earlier moves onto the source (it is not there yet) or onto the same destination (this
+    # one must overwrite it, as the last label wins) have to finish first.
+    previous_moves = [future for future in previous_moves if future is not None]
+    if previous_moves:
+        futures_wait(previous_moves)
+    dirs_before = stat_move_dirs(source_path, new_path)
+    try:
+        moved = _move_file(src_full_path, dest_subdir, dst_full_path)
+    except Exception as e:
+        print(f"Error in move_image: {e}")
+        moved = False
+    if moved:
+        record_dir_mtimes(source_path, new_path, dirs_before)
+        relocate_cached_files(source_path, new_path)
+    else:
+        # The index was updated up front, so let a rescan fix it.
+        mark_folders_dirty(source_path.split('/', 1)[0], new_path.split('/', 1)[0])
+
+
+def _forget_pending_move(new_path, future):
+    with _PENDING_MOVES_LOCK:
+        if _PENDING_MOVES.get(new_path) is future:
+            del _PENDING_MOVES[new_path]
+
+
+def wait_for_pending_move(rel_path):
+    """Blocks until a queued move to rel_path, if any, has finished, so the file can be read."""
+    with _PENDING_MOVES_LOCK:
+        future = _PENDING_MOVES.get(rel_path)
+    if future is not None:
+        futures_wait([future])
 
 
 def move_image(source_path, dest_dir, new_label=None):
     """
     Moves an image from its source path to a destination directory,
     preserving the subdirectory structure and renaming the file with the new label (if provided).
+
+    The new path is worked out and the index updated right away, while the file operation
+    itself is queued on MOVE_EXECUTOR so the request does not wait on the disk. Images
+    that are not in the index are moved synchronously, so a missing source still returns None.
     """
     try:
-        # The source_path from the front end is already relative to the 'unlabeled' folder
+        # The source_path from the front end is relative to BASE_DIR, e.g. 'unlabeled/Goa/Ambre_Colony/x.jpg'
         src_full_path = os.path.join(BASE_DIR, source_path)
-        # Check file exists
-        if not os.path.exists(src_full_path):
-            print(f"Source file not found: {src_full_path}")
-            return None
-
-        # Determine the relative subdirectory, removing the 'unlabeled' part from the path.
-        if source_path.startswith('unlabeled/'):
-            relative_subdir_path = os.path.dirname(source_path[len('unlabeled/'):])
-        else:
-            # For images already in other folders, this logic will still work.
-            relative_subdir_path = os.path.dirname(source_path)
 
-        dest_subdir = os.path.join(dest_dir, relative_subdir_path)
-
-        # Ensure the destination subdirectory exists
-        os.makedirs(dest_subdir, exist_ok=True)
+        # Split off the file name and the managed folder, keeping the subdirectory in between.
+        source_dir, _, filename = source_path.rpartition('/')
+        src_folder, _, relative_subdir_path = source_dir.partition('/')
+        if src_folder not in FOLDERS:
+            relative_subdir_path = source_dir
 
         if new_label:
             # Sanitize the new label and get the file extension
-            sanitized_label = re.sub(r'[^a-zA-Z0-9_-]', '', new_label).upper().replace(' ', '')
-            _, extension = os.path.splitext(source_path)
-            new_filename = f"{sanitized_label}{extension}"
+            sanitized_label = _LABEL_RE.sub('', new_label.upper())
+            _, dot, extension = filename.rpartition('.')
+            new_filename = f"{sanitized_label}.{extension}" if dot else sanitized_label
         else:
-            new_filename = os.path.basename(source_path)
+            new_filename = filename
 
+        # The new path relative to the BASE_DIR, and the matching absolute paths
+        dst_folder = FOLDER_NAMES[dest_dir]
+        if relative_subdir_path:
+            rel_path = f"{dst_folder}/{relative_subdir_path}/{new_filename}"
+            dest_subdir = os.path.join(dest_dir, relative_subdir_path)
+        else:
+            rel_path = f"{dst_folder}/{new_filename}"
+            dest_subdir = dest_dir
         dst_full_path = os.path.join(dest_subdir, new_filename)
 
-        # Move the file from the source to the new destination
-        shutil.move(src_full_path, dst_full_path)
-        print(f"Moved {src_full_path} to {dst_full_path}")
-
-        # Return the new path relative to the BASE_DIR
-        rel_path = os.path.relpath(dst_full_path, BASE_DIR)
-        return rel_path.replace('\\', '/')
+        if not is_indexed(source_path):
+            # A queued move onto the destination would otherwise overwrite this one later.
+            wait_for_pending_move(rel_path)
+            dirs_before = stat_move_dirs(source_path, rel_path)
+            if not _move_file(src_full_path, dest_subdir, dst_full_path):
+                return None
+            update_image_index(source_path, rel_path)
+            record_dir_mtimes(source_path, rel_path, dirs_before)
+            relocate_cached_files(source_path, rel_path)
+            return rel_path
+
+        with _PENDING_MOVES_LOCK:
+            update_image_index(source_path, rel_path)
+            previous_moves = (_PENDING_MOVES.get(source_path), _PENDING_MOVES.get(rel_path))
+            future = MOVE_EXECUTOR.submit(_finish_move, source_path, rel_path, src_full_path,
+                                          dest_subdir, dst_full_path, previous_moves)
+            _PENDING_MOVES[rel_path] = future
+        future.add_done_callback(lambda done: _forget_pending_move(rel_path, done))
+        return rel_path
     except Exception as e:
         print(f"Error in move_image: {e}")
+        # The move may have partly happened, so rescan both folders rather than guess.
+        mark_folders_dirty(source_path.split('/', 1)[0], FOLDER_NAMES.get(dest_dir))
         return None
 
 def get_image_counts():
     """Returns a dictionary with the counts of images in each folder."""
-    return {
-        'unlabeled': count_images_in_directory(UNLABELED),
-        'valid': count_images_in_directory(VALID_VEHICLE),
-        'invalid': count_images_in_directory(INVALID_VEHICLE),
-        'skipped': count_images_in_directory(SKIPPED_VEHICLE),
-    }
+    refresh_image_index()
+    with _IMAGES_LOCK:
+        return {folder_name: len(paths) for folder_name, paths in _IMAGES.items()}
+
+def get_plate_crop_jpeg(full_path, crop_path, src_mtime_ns):
+    """
+    Returns the plate crop of an image as JPEG bytes, or None if no plate was found.
+
+    The result is cached on disk at crop_path, so detection runs once per image rather than
+    once per process. An empty file records that no plate was found. The cache file gets the
+    source's mtime and is only used while the two match, so a source replaced by any other
+    file is detected again; moves keep it valid, since they keep both mtimes.
+    """
+    try:
+        if os.stat(crop_path).st_mtime_ns == src_mtime_ns:
+            with open(crop_path, 'rb') as f:
+                return f.read() or None
+    except FileNotFoundError:
+        pass
+    detection_result = run_detection_on_image(full_path)
+    if detection_result and 'plate_crop_arr' in detection_result:
+        # OpenCV's libjpeg-turbo encoder is faster than Pillow's and takes the BGR crop as is.
+        _, encoded = cv2.imencode('.jpg', detection_result['plate_crop_arr'], [cv2.IMWRITE_JPEG_QUALITY, 85])
+        crop_bytes = encoded.tobytes()
+    else:
+        crop_bytes = b''
+    # Write under a temporary name and rename so a concurrent request never reads half a file.
+    os.makedirs(os.path.dirname(crop_path), exist_ok=True)
+    tmp_path = f"{crop_path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(crop_bytes)
+    os.utime(tmp_path, ns=(src_mtime_ns, src_mtime_ns))
+    os.replace(tmp_path, crop_path)
+    return crop_bytes or None
+
+def encode_json_payload(obj):
+    """Returns obj as JSON bytes, plus a gzipped copy if the body is at least COMPRESS_MIN_SIZE bytes (else None)."""
+    body = orjson.dumps(obj)
+    gzipped_body = gzip.compress(body, compresslevel=6) if len(body) >= COMPRESS_MIN_SIZE else None
+    return body, gzipped_body
+
+
+def compressed_json_response(body, gzipped_body):
+    """Returns an encoded JSON payload, sending the gzipped copy when there is one and the client accepts it."""
+    response = Response(body, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if gzipped_body is not None and request.accept_encodings['gzip'] > 0:
+        response.set_data(gzipped_body)
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def get_image_list():
+    """
+    Returns every indexed image path, grouped by folder in FOLDERS order.
+
+    The list is only re-sorted when the index generation has changed since the last call.
+    """
+    with _IMAGES_LOCK:
+        if _image_list_cache['generation'] == _index_generation:
+            return _image_list_cache['images']
+        generation = _index_generation
+        image_list = [path for folder_name in FOLDERS for path in sorted(_IMAGES[folder_name])]
+        _image_list_cache.update(generation=generation, images=image_list, body=None, gzipped_body=None)
+    return image_list
+
+
+def get_image_list_payload():
+    """
+    Returns the full /images/all list encoded by encode_json_payload.
+
+    Serializing and compressing is done once per cached list from get_image_list.
+    """
+    image_list = get_image_list()
+    with _IMAGES_LOCK:
+        if _image_list_cache['images'] is image_list and _image_list_cache['body'] is not None:
+            return _image_list_cache['body'], _image_list_cache['gzipped_body']
+    body, gzipped_body = encode_json_payload(image_list)
+    with _IMAGES_LOCK:
+        if _image_list_cache['images'] is image_list:
+            _image_list_cache.update(body=body, gzipped_body=gzipped_body)
+    return body, gzipped_body
+
+def managed_image_path(filename):
+    """
+    Returns the absolute path of a requested image, or None unless it is an image file name
+    inside one of FOLDERS.
+
+    safe_join normalizes the path first, so e.g. 'valid/../_thumbs/x.jpg' is rejected as well.
+    """
+    full_path = safe_join(BASE_DIR, filename)
+    if full_path is None or full_path[_BASE_PREFIX_LEN:].split('/', 1)[0] not in FOLDERS:
+        return None
+    if full_path[full_path.rfind('.'):].lower() not in IMG_EXTS:
+        return None
+    return full_path
+
+
+def normalize_path(path):
+    """Converts Windows-style backslashes in a client-supplied image path to forward slashes (None if not a string)."""
+    if not isinstance(path, str):
+        return None
+    return path.replace('\\', '/') if '\\' in path else path
+
+
+def parse_image_request():
+    """Returns the 'img' and 'label' fields of a POSTed JSON body, parsing it only once (None if missing)."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None, None
+    return normalize_path(data.get('img')), data.get('label')
 
 # --- API Endpoints ---
 @app.route('/')
@@ -137,22 +649,23 @@ def index():
 
 @app.route('/images/all')
 def get_all_images():
-    image_list = []
-    # For each folder, get relative paths with the folder name prefixed
-    folders = {
-        'unlabeled': UNLABELED,
-        'valid': VALID_VEHICLE,
-        'invalid': INVALID_VEHICLE,
-        'skipped': SKIPPED_VEHICLE,
-    }
-    for folder_name, folder_path in folders.items():
-        for root, _, files in os.walk(folder_path):
-            for file in files:
-                if file.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                    rel_path = os.path.relpath(os.path.join(root, file), BASE_DIR)
-                    rel_path = os.path.normpath(rel_path)
-                    image_list.append(rel_path.replace('\\', '/'))  # Normalize slashes for URLs
-    return jsonify(image_list)
+    """
+    Returns every indexed image path, grouped by folder in FOLDERS order.
+
+    Optional `offset` and `limit` query parameters return one page of the list instead,
+    with the full length in the X-Total-Count header.
+    """
+    refresh_image_index()
+    offset = request.args.get('offset', type=int)
+    limit = request.args.get('limit', type=int)
+    if offset is None and limit is None:
+        return compressed_json_response(*get_image_list_payload())
+    image_list = get_image_list()
+    start = max(offset or 0, 0)
+    end = start + max(limit, 0) if limit is not None else None
+    response = jsonify(image_list[start:end])
+    response.headers['X-Total-Count'] = str(len(image_list))
+    return response
 
 @app.route('/images/counts')
 def get_counts():
@@ -161,27 +674,70 @@ def get_counts():
 
 @app.route('/preview_crop/<path:filename>')
 def preview_crop(filename):
-    full_path = os.path.join(BASE_DIR, filename)
-    if not os.path.exists(full_path):
+    full_path = managed_image_path(filename)
+    crop_path = safe_join(CROPS, filename)
+    if full_path is None or crop_path is None:
         return jsonify({'error': 'Image not found at specified path'}), 404
+    wait_for_pending_move(filename)
     try:
-        detection_result = run_detection_on_image(full_path)
-        if detection_result and 'plate_crop' in detection_result:
-            img_io = BytesIO()
-            detection_result['plate_crop'].save(img_io, 'JPEG')
-            img_io.seek(0)
-            return send_file(img_io, mimetype='image/jpeg')
-        else:
+        st = os.stat(full_path)
+    except FileNotFoundError:
+        return jsonify({'error': 'Image not found at specified path'}), 404
+    # The crop only depends on the source file, so its size and mtime make a cheap ETag.
+    # A browser revalidating a crop it already has gets a 304 without running detection.
+    etag = f'{st.st_size:x}-{st.st_mtime_ns:x}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        try:
+            crop_bytes = get_plate_crop_jpeg(full_path, f"{crop_path}.jpg", st.st_mtime_ns)
+        except Exception as e:
+            print(f"Error processing image for crop: {e}", file=sys.stderr)
+            return jsonify({'error': f'An error occurred: {e}'}), 500
+        if crop_bytes is None:
             return jsonify({'error': 'No license plate detected'}), 404
-    except Exception as e:
-        print(f"Error processing image for crop: {e}", file=sys.stderr)
-        return jsonify({'error': f'An error occurred: {e}'}), 500
+        # Hand the encoded bytes straight to the response.
+        response = Response(crop_bytes, mimetype='image/jpeg')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+    return response
+
+@app.route('/thumb/<path:filename>')
+def serve_thumbnail(filename):
+    """Serves a downscaled copy of an image, generating it on first request or when the source changed."""
+    full_path = managed_image_path(filename)
+    thumb_path = safe_join(THUMBNAILS, filename)
+    if full_path is None or thumb_path is None:
+        return jsonify({'error': 'Image not found'}), 404
+    wait_for_pending_move(filename)
+    try:
+        src_mtime_ns = os.stat(full_path).st_mtime_ns
+    except FileNotFoundError:
+        return jsonify({'error': 'Image not found'}), 404
+    try:
+        is_stale = os.stat(thumb_path).st_mtime_ns != src_mtime_ns
+    except FileNotFoundError:
+        is_stale = True
+    if is_stale:
+        try:
+            save_thumbnail(full_path, thumb_path)
+        except Exception as e:
+            print(f"Error creating thumbnail: {e}", file=sys.stderr)
+            return jsonify({'error': f'An error occurred: {e}'}), 500
+    if X_ACCEL_THUMBS_URL:
+        # Let nginx send the file from its internal location instead of a Python worker.
+        response = Response(mimetype=mimetypes.guess_type(thumb_path)[0])
+        response.headers['X-Accel-Redirect'] = f"{X_ACCEL_THUMBS_URL}/{quote(filename)}"
+        return response
+    return send_file(thumb_path, conditional=True, max_age=STATIC_IMAGES_MAX_AGE)
 
 @app.route('/images/label', methods=['POST'])
 def update_label():
     """Handles the 'update label' action."""
-    relative_img_path = request.json['img']
-    label = request.json['label']
+    relative_img_path, label = parse_image_request()
+    if not relative_img_path:
+        return jsonify({'success': False, 'error': 'Missing image'}), 400
     new_path = move_image(relative_img_path, VALID_VEHICLE, label)
     if new_path is None:
         return jsonify({'success': False, 'error': 'Failed to move image'}), 500
@@ -191,8 +747,10 @@ def update_label():
 @app.route('/images/valid', methods=['POST'])
 def valid_image():
     """Handles the 'valid' action."""
-    relative_img_path = request.json['img']
-    label = request.json.get('label') or os.path.splitext(os.path.basename(relative_img_path))[0]
+    relative_img_path, label = parse_image_request()
+    if not relative_img_path:
+        return jsonify({'success': False, 'error': 'Missing image'}), 400
+    label = label or os.path.splitext(os.path.basename(relative_img_path))[0]
     new_path = move_image(relative_img_path, VALID_VEHICLE, label)
     if new_path is None:
         return jsonify({'success': False, 'error': 'Failed to move image'}), 500
@@ -202,7 +760,9 @@ def valid_image():
 @app.route('/images/invalid', methods=['POST'])
 def invalid_image():
     """Handles the 'invalid' action."""
-    relative_img_path = request.json['img']
+    relative_img_path, _ = parse_image_request()
+    if not relative_img_path:
+        return jsonify({'success': False, 'error': 'Missing image'}), 400
     new_path = move_image(relative_img_path, INVALID_VEHICLE)
     if new_path is None:
         return jsonify({'success': False, 'error': 'Failed to move image'}), 500
@@ -212,33 +772,53 @@ def invalid_image():
 @app.route('/images/skip', methods=['POST'])
 def skip_image():
     """Handles the 'skip' action."""
-    relative_img_path = request.json['img']
+    relative_img_path, _ = parse_image_request()
+    if not relative_img_path:
+        return jsonify({'success': False, 'error': 'Missing image'}), 400
     new_path = move_image(relative_img_path, SKIPPED_VEHICLE)
     if new_path is None:
         return jsonify({'success': False, 'error': 'Failed to move image'}), 500
     counts = get_image_counts()
     return jsonify({'success': True, 'new_path': new_path, 'counts': counts})
 
-@app.route('/images/serve/<path:filepath>')
-def serve_image(filepath):
-    """Serves an image from any directory relative to the BASE_DIR."""
-    full_path = os.path.join(BASE_DIR, filepath)
-    if not os.path.exists(full_path):
-        print(f"File not found: {full_path}")
-        return jsonify({'error': 'Image not found'}), 404
-    # Serve file from its real folder
-    # Serve relative to BASE_DIR
-    folder = os.path.dirname(full_path)
-    filename = os.path.basename(full_path)
-    return send_from_directory(folder, filename)
-
+@app.route('/images/batch', methods=['POST'])
+def batch_images():
+    """
+    Applies several actions in one request, e.g. {"ops": [{"img": ..., "action": "skip"}, ...]}.
 
-# --- Image Serving Routes ---
-@app.route('/unlabeled/<path:filename>')
-def serve_unlabeled(filename):
-    """Serves an unlabeled image from the directory."""
-    return send_from_directory(UNLABELED, filename)
+    Each op takes the same fields as the single-action routes, with "action" being one of
+    'label', 'valid', 'invalid' or 'skip'. Counts are computed once for the whole batch.
+    """
+    data = request.get_json(silent=True)
+    ops = data.get('ops', []) if isinstance(data, dict) else None
+    if not isinstance(ops, list):
+        return jsonify({'success': False, 'error': 'Expected a JSON object with an "ops" list'}), 400
+    results = []
+    for op in ops:
+        if not isinstance(op, dict):
+            results.append({'img': None, 'success': False, 'error': 'Invalid operation'})
+            continue
+        relative_img_path = normalize_path(op.get('img'))
+        action = op.get('action')
+        if not relative_img_path or not isinstance(action, str) or action not in BATCH_ACTIONS:
+            results.append({'img': relative_img_path, 'success': False, 'error': 'Invalid operation'})
+            continue
+        label = op.get('label')
+        if action == 'valid':
+            label = label or os.path.splitext(os.path.basename(relative_img_path))[0]
+        elif action != 'label':
+            label = None
+        new_path = move_image(relative_img_path, BATCH_ACTIONS[action], label)
+        if new_path is None:
+            results.append({'img': relative_img_path, 'success': False, 'error': 'Failed to move image'})
+        else:
+            results.append({'img': relative_img_path, 'success': True, 'new_path': new_path})
+    counts = get_image_counts()
+    return jsonify({'success': all(result['success'] for result in results), 'results': results, 'counts': counts})
 
 if __name__ == '__main__':
     setup_directories()
-    app.run(debug=True, port=8000, use_reloader=True)
+    load_detection_model()  # Load the weights now so the first preview is not slowed down.
+    # Debug mode and the reloader stay off unless FLASK_DEBUG=1 is set; Flask reads it in app.run.
+    # For production, use a WSGI server instead (see wsgi.py and the Procfile).
+    app.run(port=8000)
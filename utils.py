@@ -1,39 +1,195 @@
 import os
-from PIL import Image
+import queue
+import threading
+import time
+import numpy as np
+import torch
+from PIL import Image, ImageOps
 from ultralytics import YOLO
 
-DETECTION_MODEL_PATH = "models/license_plate_detect_v1_E160.pt"
+# Point this at an exported model (e.g. ONNX or INT8 OpenVINO, see the README) to use it instead of the PyTorch weights.
+DETECTION_MODEL_PATH = os.environ.get("DETECTION_MODEL_PATH", "models/license_plate_detect_v1_E160.pt")
+# Inference resolution; a plate box needs far less than the default 640, and 576 matches LPYOLO-style setups.
+DETECTION_IMGSZ = 576
+# FP16 only pays off on a GPU. ultralytics keeps half=True for .pt weights even on CPU, where it is slow or unsupported.
+DETECTION_HALF = torch.cuda.is_available()
+THUMBNAIL_SIZE = (600, 600)
+IMG_EXTS = frozenset({'.jpg', '.jpeg', '.png', '.gif'})
+
+DETECTION_BATCH_SIZE = 8
+DETECTION_MAX_LATENCY = 0.01  # Seconds to wait for more images before running a partial batch.
+
+_model = None
+_MODEL_LOCK = threading.Lock()
+
+
+def load_detection_model():
+    """Returns the detection model, loading the weights only on the first call."""
+    global _model
+    if _model is None:
+        with _MODEL_LOCK:
+            if _model is None:
+                _model = YOLO(DETECTION_MODEL_PATH)
+    return _model
+
+
+class _PendingPrediction:
+    __slots__ = ('img', 'done', 'result', 'error')
+
+    def __init__(self, img):
+        self.img = img
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BatchPredictor:
+    """
+    Runs images from concurrent callers through a model in batches.
+
+    A single background thread takes the first queued image, keeps collecting more until
+    batch_size are queued or max_latency seconds have passed, and then makes one model
+    call for all of them. Each caller blocks until its own result is ready. The model is
+    therefore only ever used from that one thread.
+    """
+
+    def __init__(self, predict_batch, batch_size=DETECTION_BATCH_SIZE, max_latency=DETECTION_MAX_LATENCY):
+        self._predict_batch = predict_batch
+        self._batch_size = batch_size
+        self._max_latency = max_latency
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def predict(self, img):
+        """Queues one image and returns its result once its batch has run."""
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='batch-predictor', daemon=True)
+                self._worker.start()
+        pending = _PendingPrediction(img)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self._max_latency
+            while len(batch) < self._batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                results = self._predict_batch([pending.img for pending in batch])
+                for pending, result in zip(batch, results):
+                    pending.result = result
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            for pending in batch:
+                pending.done.set()
+
+
+def _predict_batch(imgs):
+    return load_detection_model().predict(imgs, imgsz=DETECTION_IMGSZ, half=DETECTION_HALF, verbose=False)
+
+
+_batch_predictor = BatchPredictor(_predict_batch)
+
+
+def _crop_full_resolution(image_path, box, scaled_size):
+    """Cuts a box found on a draft-decoded image out of the full-resolution image, as a BGR array."""
+    with Image.open(image_path) as img:
+        scale_x = img.width / scaled_size[0]
+        scale_y = img.height / scaled_size[1]
+        x1, y1, x2, y2 = box
+        crop = img.crop((round(x1 * scale_x), round(y1 * scale_y),
+                         min(round(x2 * scale_x), img.width), min(round(y2 * scale_y), img.height)))
+    if crop.mode != "RGB":
+        crop = crop.convert("RGB")
+    return np.asarray(crop)[:, :, ::-1]
 
 
 def run_detection_on_image(image_path):
-    img = Image.open(image_path).convert("RGB")
-    model_path = DETECTION_MODEL_PATH
-    model = YOLO(model_path)
-    results = model(img)
+    img = Image.open(image_path)
+    full_size = img.size
+    # The model letterboxes its input to DETECTION_IMGSZ anyway, so let libjpeg decode JPEGs
+    # straight to RGB at a reduced scale (1/2, 1/4 or 1/8) that still covers that size.
+    # This is a no-op for other formats and for images that are already small.
+    img.draft("RGB", (DETECTION_IMGSZ, DETECTION_IMGSZ))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    # Concurrent requests are batched into a single model call.
+    result = _batch_predictor.predict(img)
     # Find the first box with class==0 (assuming 0 = license plate)
-    for box in results[0].boxes:
+    for box in result.boxes:
         class_id = int(box.cls[0])
         if class_id == 0:
             x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-            plate_crop = img.crop((x1, y1, x2, y2))
-            return {"plate_crop": plate_crop}
+            if img.size != full_size:
+                # The operator reads the plate off the crop, so take it from the full-resolution
+                # image rather than the reduced one the model saw.
+                return {"plate_crop_arr": _crop_full_resolution(image_path, (x1, y1, x2, y2), img.size)}
+            # orig_img is the HWC BGR array the model already made from img; slicing it gives a
+            # view, so neither the crop nor a second conversion of img copies any pixels.
+            plate_crop_arr = result.orig_img[y1:y2, x1:x2]
+            return {"plate_crop_arr": plate_crop_arr}
     return {}
 
 
-def save_cropped_plate_by_label(src_img_path, dest_folder, label):
-    result = run_detection_on_image(src_img_path)
-    if result and 'plate_crop' in result:
-        plate_crop = result['plate_crop']
-        crop_path = os.path.join(dest_folder, f"{label}.jpg")
-        plate_crop.save(crop_path)
+def save_thumbnail(src_img_path, thumb_path, size=THUMBNAIL_SIZE):
+    """
+    Writes a copy of an image downscaled to fit within size, keeping its format.
+
+    For JPEGs, Image.draft lets libjpeg decode directly at 1/2, 1/4 or 1/8 scale, so most
+    of the full-resolution decode is skipped. The file is written under a temporary name
+    and renamed so a concurrent request never serves a half-written thumbnail. It gets the
+    source's mtime, so a source replaced by any other file, even an older one, shows as stale.
+    """
+    src_mtime_ns = os.stat(src_img_path).st_mtime_ns
+    with Image.open(src_img_path) as img:
+        img_format = img.format
+        img.draft('RGB', (size[0] * 2, size[1] * 2))
+        # The saved copy has no EXIF, so apply the Orientation tag browsers would have honoured.
+        ImageOps.exif_transpose(img, in_place=True)
+        img.thumbnail(size, Image.Resampling.LANCZOS)
+        os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+        tmp_path = f"{thumb_path}.{threading.get_ident()}.tmp"
+        img.save(tmp_path, format=img_format, quality=80)
+    os.utime(tmp_path, ns=(src_mtime_ns, src_mtime_ns))
+    os.replace(tmp_path, thumb_path)
+
 
-def count_images_in_directory(directory):
-    """Recursively counts the number of files in a directory."""
-    count = 0
-    if os.path.exists(directory):
-        for root, _, files in os.walk(directory):
-            for file in files:
-                if file.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                    count += 1
-    return count
+def iter_images(directory, dir_mtimes=None):
+    """
+    Recursively yields an os.DirEntry for every image file under a directory.
 
+    Uses an explicit os.scandir stack instead of os.walk so the file type comes
+    from the cached DirEntry data and no extra stat call is made per entry.
+    If a dict is passed as dir_mtimes, it is filled with the st_mtime_ns of every
+    directory visited, taken just before the directory is listed.
+    Directories that are missing or cannot be read are skipped.
+    """
+    stack = [directory]
+    while stack:
+        dir_path = stack.pop()
+        try:
+            if dir_mtimes is not None:
+                dir_mtimes[dir_path] = os.stat(dir_path).st_mtime_ns
+            it = os.scandir(dir_path)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                # Lower-case only the extension and look it up in the set in one step.
+                elif entry.name[entry.name.rfind('.'):].lower() in IMG_EXTS:
+                    yield entry
@@ -0,0 +1,12 @@
+"""
+WSGI entry point for production servers, e.g. `gunicorn wsgi:app` or `waitress-serve wsgi:app`.
+
+The directories, the image index and the detection model are set up at import time,
+since `app.py`'s `__main__` block does not run under a WSGI server.
+"""
+
+from app import app, setup_directories
+from utils import load_detection_model
+
+setup_directories()
+load_detection_model()